@@ -1,7 +1,14 @@
 import os
+import re
+import time
+import asyncio
 import logging
-import sqlite3
+import functools
 import datetime
+import pathlib
+import contextlib
+import collections
+import aiosqlite
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
 
@@ -16,20 +23,205 @@ logger = logging.getLogger(__name__)
 BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
 DATABASE_PATH = "file_storage.db"
 INITIAL_ADMIN_ID = int(os.environ.get("INITIAL_ADMIN_ID", "0"))  # Set your Telegram user ID as default admin
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL")  # Public HTTPS base URL; when set, updates arrive by webhook instead of polling
+PORT = int(os.environ.get("PORT", "8443"))  # Port the webhook server listens on
+CONCURRENT_UPDATES = 256  # Updates handled at the same time
+CONNECTION_POOL_SIZE = 256  # HTTP connections to the Bot API; keep at least CONCURRENT_UPDATES
+POOL_TIMEOUT = 30  # Seconds to wait for a free HTTP connection
+DB_READ_POOL_SIZE = os.cpu_count() or 4  # Read-only SQLite connections kept open for handlers
+DB_STATEMENT_CACHE_SIZE = 256  # Prepared statements each connection keeps for reuse, keyed by SQL text
+SCHEMA_VERSION = 1  # Stored in PRAGMA user_version; bump when create_schema changes
 
-# Create a connection to the SQLite database
-def get_db_connection():
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Pools of open database connections, filled in post_init
+_write_pool = None
+_read_pool = None
 
-# Initialize the database
-def init_db():
-    conn = get_db_connection()
-    cursor = conn.cursor()
+# In-memory copy of the admin user IDs, so permission checks don't hit the database. It is
+# loaded at startup and kept current by /addadmin and /removeadmin, the only admin writers
+_admin_cache = None
+
+STATS_FLUSH_INTERVAL = 2  # Seconds between writes of buffered stat counts
+
+# Whether SQLite has FTS5, detected by init_db; search uses prefix matching without it
+_fts_enabled = False
+
+# Downloads and searches counted since the last write to the stats table
+_pending_stats = {"downloads": 0, "searches": 0}
+_stats_flusher_task = None
+_stats_flush_lock = None  # Serializes flushes, so a count is never written twice
+
+FILE_CACHE_TTL = 30  # Seconds a Download button's file lookup stays cached
+FILE_CACHE_SIZE = 1024  # Maximum number of cached file lookups
+
+# Recently downloaded files, least recently used first: database ID -> (Telegram file ID, file type, expiry time)
+_file_cache = collections.OrderedDict()
+
+# Multipliers converting byte counts to megabytes and gigabytes for display
+MB = 1 / 1024 ** 2
+GB = 1 / 1024 ** 3
+
+# Static bot messages
+WELCOME_MESSAGE = (
+    "Welcome to the File Sharing Bot!\n\n"
+    "Admin Commands:\n"
+    "📤 Upload any file to store it\n"
+    "🔍 /search <keyword> - Search for files\n"
+    "📊 /stats - View bot statistics\n"
+    "🔗 /link <file_id> - Get a shareable link\n"
+    "📝 /editdesc <file_id> <description> - Edit file description\n"
+    "✏️ /editname <file_id> <new_name> - Edit file name\n"
+    "🏷️ /addtag <file_id> <tag> - Add tag to file\n"
+    "🏷️ /removetag <file_id> <tag> - Remove tag from file\n"
+    "👤 /addadmin <user_id> - Add new admin\n"
+    "👤 /removeadmin <user_id> - Remove admin\n"
+    "👥 /listadmins - List all admins\n"
+    "🗑️ /deletefile <file_id> - Delete a file\n"
+    "ⓘ /info <file_id> - Get file information\n"
+    "\n\n"
+    "Note: All commands can only be used by admins."
+)
+ADMIN_ONLY_MESSAGE = "Sorry, this command is for admins only."
+
+# Hashtags in upload captions become file tags
+TAG_RE = re.compile(r"#(\w+)")
+
+# Apply per-connection settings; journal_mode is stored in the database file, so only the writer sets it.
+# Rows default to aiosqlite.Row for named access; single-column reads reset their cursor's
+# row_factory to None and take plain tuples instead
+async def configure_connection(conn, writer):
+    conn.row_factory = aiosqlite.Row
+    if writer:
+        await conn.execute('PRAGMA journal_mode = WAL')
+        await conn.execute('PRAGMA synchronous = NORMAL')
+        await conn.execute('PRAGMA foreign_keys = ON')
+    await conn.execute('PRAGMA busy_timeout = 5000')
+    await conn.execute('PRAGMA cache_size = -20000')
+    await conn.execute('PRAGMA temp_store = MEMORY')
+
+# Open the long-lived SQLite connections shared by all handlers: a single writer and a pool of
+# read-only connections, which WAL mode lets run alongside the writer without blocking
+async def open_db_pools():
+    global _write_pool, _read_pool
+    _write_pool = asyncio.Queue()
+    conn = await aiosqlite.connect(DATABASE_PATH, cached_statements=DB_STATEMENT_CACHE_SIZE)
+    # Pool each connection before configuring it, so close_db_pools closes it if that fails
+    _write_pool.put_nowait(conn)
+    await configure_connection(conn, writer=True)
+    
+    _read_pool = asyncio.Queue()
+    read_only_uri = pathlib.Path(DATABASE_PATH).resolve().as_uri() + "?mode=ro"
+    for _ in range(DB_READ_POOL_SIZE):
+        conn = await aiosqlite.connect(read_only_uri, uri=True, cached_statements=DB_STATEMENT_CACHE_SIZE)
+        _read_pool.put_nowait(conn)
+        await configure_connection(conn, writer=False)
+
+# Close every pooled connection; pools are None if startup failed before opening them
+async def close_db_pools():
+    for pool in (_read_pool, _write_pool):
+        while pool is not None and not pool.empty():
+            await pool.get_nowait().close()
+
+# Borrow a read-only connection
+@contextlib.asynccontextmanager
+async def db_read():
+    conn = await _read_pool.get()
+    try:
+        yield conn
+    finally:
+        _read_pool.put_nowait(conn)
+
+# Borrow the writer connection; the block runs in one transaction that is committed
+# when it finishes and rolled back if it fails
+@contextlib.asynccontextmanager
+async def db_write():
+    conn = await _write_pool.get()
+    try:
+        await conn.execute('BEGIN IMMEDIATE')
+        yield conn
+        await conn.commit()
+    except BaseException:
+        await conn.rollback()
+        raise
+    finally:
+        _write_pool.put_nowait(conn)
+
+# Check whether this SQLite build includes the FTS5 extension
+async def has_fts5(cursor):
+    try:
+        await cursor.execute('CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)')
+    except aiosqlite.OperationalError:
+        return False
+    await cursor.execute('DROP TABLE temp.fts5_probe')
+    return True
+
+# Create the full-text index and the triggers that keep it in sync
+async def init_fts(cursor):
+    # Drop a full-text index built without stemming; it is recreated and refilled below
+    await cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'files_fts'")
+    fts_table = await cursor.fetchone()
+    if fts_table and 'porter' not in fts_table['sql']:
+        await cursor.execute('DROP TABLE files_fts')
+    
+    # An index left without its sync triggers (while FTS5 was unavailable) may hold stale
+    # names, descriptions and tags; empty it so the backfill below rebuilds every row
+    await cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'files_fts_insert'")
+    if fts_table and not await cursor.fetchone():
+        await cursor.execute('DELETE FROM files_fts')
+    
+    # Create full-text index over file names, descriptions and tags
+    await cursor.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+        file_name,
+        description,
+        tags,
+        tokenize = 'porter unicode61 remove_diacritics 2'
+    )
+    ''')
+    
+    # Keep the full-text index in sync with the files and tags tables
+    await cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS files_fts_insert AFTER INSERT ON files BEGIN
+        INSERT INTO files_fts (rowid, file_name, description, tags)
+        VALUES (new.id, new.file_name, new.description, '');
+    END
+    ''')
+    await cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS files_fts_update AFTER UPDATE OF file_name, description ON files BEGIN
+        UPDATE files_fts SET file_name = new.file_name, description = new.description
+        WHERE rowid = new.id;
+    END
+    ''')
+    await cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS files_fts_delete AFTER DELETE ON files BEGIN
+        DELETE FROM files_fts WHERE rowid = old.id;
+    END
+    ''')
+    await cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS tags_fts_insert AFTER INSERT ON tags BEGIN
+        UPDATE files_fts SET tags = (SELECT group_concat(tag, ' ') FROM tags WHERE file_id = new.file_id)
+        WHERE rowid = new.file_id;
+    END
+    ''')
+    await cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS tags_fts_delete AFTER DELETE ON tags BEGIN
+        UPDATE files_fts SET tags = coalesce((SELECT group_concat(tag, ' ') FROM tags WHERE file_id = old.file_id), '')
+        WHERE rowid = old.file_id;
+    END
+    ''')
     
+    # Index any files stored before the full-text index existed
+    await cursor.execute('''
+    INSERT INTO files_fts (rowid, file_name, description, tags)
+    SELECT f.id, f.file_name, f.description,
+           coalesce((SELECT group_concat(t.tag, ' ') FROM tags t WHERE t.file_id = f.id), '')
+    FROM files f
+    WHERE f.id NOT IN (SELECT rowid FROM files_fts)
+    ''')
+
+# Create or migrate the tables, indexes and full-text index
+async def create_schema(cursor, fts):
     # Create files table
-    cursor.execute('''
+    await cursor.execute('''
     CREATE TABLE IF NOT EXISTS files (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         file_id TEXT NOT NULL,
@@ -38,12 +230,18 @@ def init_db():
         uploaded_by INTEGER NOT NULL,
         upload_date TEXT NOT NULL,
         mime_type TEXT,
-        file_size INTEGER
+        file_size INTEGER,
+        file_type TEXT NOT NULL DEFAULT 'document'
     )
     ''')
     
+    # Add file_type to files tables created before it existed
+    await cursor.execute("SELECT 1 FROM pragma_table_info('files') WHERE name = 'file_type'")
+    if not await cursor.fetchone():
+        await cursor.execute("ALTER TABLE files ADD COLUMN file_type TEXT NOT NULL DEFAULT 'document'")
+    
     # Create tags table
-    cursor.execute('''
+    await cursor.execute('''
     CREATE TABLE IF NOT EXISTS tags (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         file_id INTEGER NOT NULL,
@@ -53,7 +251,7 @@ def init_db():
     ''')
     
     # Create admins table
-    cursor.execute('''
+    await cursor.execute('''
     CREATE TABLE IF NOT EXISTS admins (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         user_id INTEGER NOT NULL UNIQUE,
@@ -62,7 +260,7 @@ def init_db():
     ''')
     
     # Create stats table
-    cursor.execute('''
+    await cursor.execute('''
     CREATE TABLE IF NOT EXISTS stats (
         id INTEGER PRIMARY KEY,
         total_files INTEGER DEFAULT 0,
@@ -72,147 +270,232 @@ def init_db():
     )
     ''')
     
-    # Insert initial admin if not exists
-    if INITIAL_ADMIN_ID != 0:
-        cursor.execute('''
-        INSERT OR IGNORE INTO admins (user_id, added_on)
-        VALUES (?, ?)
-        ''', (INITIAL_ADMIN_ID, datetime.datetime.now().isoformat()))
+    # Create indexes for tag lookups by file (and file + tag) and by tag name;
+    # the composite index also serves file-only lookups, replacing idx_tags_file_id
+    await cursor.execute('CREATE INDEX IF NOT EXISTS idx_tags_file_tag ON tags (file_id, tag)')
+    await cursor.execute('DROP INDEX IF EXISTS idx_tags_file_id')
+    await cursor.execute('CREATE INDEX IF NOT EXISTS idx_tags_tag ON tags (tag)')
+    
+    # Tags are stored lowercase; normalize any saved before that
+    await cursor.execute('UPDATE tags SET tag = lower(tag) WHERE tag <> lower(tag)')
+    
+    # Full-text search needs SQLite's FTS5 extension; without it search falls back to
+    # indexed prefix matching
+    if fts:
+        await init_fts(cursor)
+        
+        # The prefix search indexes are unused with full-text search
+        await cursor.execute('DROP INDEX IF EXISTS idx_files_name')
+        await cursor.execute('DROP INDEX IF EXISTS idx_files_description')
+    else:
+        # The sync triggers would make every write to files and tags fail
+        for trigger in ('files_fts_insert', 'files_fts_update', 'files_fts_delete',
+                        'tags_fts_insert', 'tags_fts_delete'):
+            await cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        
+        # Case-insensitive indexes for prefix search
+        await cursor.execute('CREATE INDEX IF NOT EXISTS idx_files_name ON files (file_name COLLATE NOCASE)')
+        await cursor.execute('CREATE INDEX IF NOT EXISTS idx_files_description ON files (description COLLATE NOCASE)')
     
     # Initialize stats if not exists
-    cursor.execute('''
+    await cursor.execute('''
     INSERT OR IGNORE INTO stats (id, total_files, total_downloads, total_searches, last_updated)
-    VALUES (1, 0, 0, 0, ?)
-    ''', (datetime.datetime.now().isoformat(),))
-    
-    conn.commit()
-    conn.close()
+    VALUES (1, 0, 0, 0, CURRENT_TIMESTAMP)
+    ''')
+
+# Initialize the database
+async def init_db():
+    global _fts_enabled
+    async with db_write() as conn:
+        cursor = await conn.cursor()
+        _fts_enabled = await has_fts5(cursor)
+        
+        # Schema setup is skipped once the database is at SCHEMA_VERSION, unless FTS5 has
+        # appeared or disappeared since the full-text triggers were last set up
+        await cursor.execute('PRAGMA user_version')
+        schema_version = (await cursor.fetchone())[0]
+        await cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'files_fts_insert'")
+        fts_synced = await cursor.fetchone() is not None
+        if schema_version < SCHEMA_VERSION or fts_synced != _fts_enabled:
+            await create_schema(cursor, _fts_enabled)
+            await cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        
+        # The initial admin comes from the environment, so is checked on every start
+        if INITIAL_ADMIN_ID != 0:
+            await cursor.execute('''
+            INSERT OR IGNORE INTO admins (user_id, added_on)
+            VALUES (?, CURRENT_TIMESTAMP)
+            ''', (INITIAL_ADMIN_ID,))
+
+# Format a stored timestamp for display. Only values known to be UTC are labelled as such:
+# SQLite's CURRENT_TIMESTAMP form and "+00:00" isoformat strings. Naive isoformat strings
+# were written by older versions in the server's local time
+def format_timestamp(value):
+    if 'T' not in value or value.endswith('+00:00'):
+        return f"{value[:19]} UTC"
+    return value[:19]
+
+# Turn search input into an FTS5 query: each word is quoted so user input can't inject
+# query syntax, and matched as a token prefix so "quart" finds "Quarterly"
+def build_fts_query(keyword):
+    return ' '.join('"' + word.replace('"', '""') + '"*' for word in keyword.split())
+
+# Turn search input into a LIKE prefix pattern, escaping LIKE wildcards; a trailing "*" is
+# accepted for symmetry with full-text search. The pattern ends in "%" so indexes apply
+def build_like_prefix(keyword):
+    prefix = keyword.rstrip('*')
+    for char in ('\\', '%', '_'):
+        prefix = prefix.replace(char, '\\' + char)
+    return prefix + '%'
+
+# Load the admin user IDs into memory
+async def load_admin_cache():
+    global _admin_cache
+    async with db_read() as conn:
+        cursor = await conn.cursor()
+        cursor.row_factory = None
+        await cursor.execute('SELECT user_id FROM admins')
+        _admin_cache = {user_id for (user_id,) in await cursor.fetchall()}
 
 # Check if user is admin
 async def is_admin(user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    admin = cursor.execute('SELECT * FROM admins WHERE user_id = ?', (user_id,)).fetchone()
-    conn.close()
-    return admin is not None
+    # The initial admin can't be removed, so needs no lookup
+    if user_id == INITIAL_ADMIN_ID:
+        return True
+    
+    if _admin_cache is None:
+        await load_admin_cache()
+    return user_id in _admin_cache
 
 # Admin-only decorator
 def admin_only(func):
+    @functools.wraps(func)
     async def wrapped(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
         user_id = update.effective_user.id
         if await is_admin(user_id):
             return await func(update, context, *args, **kwargs)
+        elif update.callback_query:
+            await update.callback_query.answer(ADMIN_ONLY_MESSAGE, show_alert=True)
+            return None
         else:
-            await update.message.reply_text("Sorry, this command is for admins only.")
+            await update.effective_message.reply_text(ADMIN_ONLY_MESSAGE)
             return None
     return wrapped
 
 # Update stats
-async def update_stats(stat_type):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    if stat_type == "files":
-        cursor.execute('UPDATE stats SET total_files = total_files + 1, last_updated = ? WHERE id = 1', 
-                     (datetime.datetime.now().isoformat(),))
-    elif stat_type == "downloads":
-        cursor.execute('UPDATE stats SET total_downloads = total_downloads + 1, last_updated = ? WHERE id = 1',
-                     (datetime.datetime.now().isoformat(),))
-    elif stat_type == "searches":
-        cursor.execute('UPDATE stats SET total_searches = total_searches + 1, last_updated = ? WHERE id = 1',
-                     (datetime.datetime.now().isoformat(),))
-    
-    conn.commit()
-    conn.close()
+def update_stats(stat_type):
+    # Counters are buffered in memory and written in batches by flush_stats
+    _pending_stats[stat_type] += 1
+
+# Write buffered stat counts to the stats table
+async def flush_stats():
+    # The lock is created once the database is ready; without it there is nothing to flush to
+    if _stats_flush_lock is None:
+        return
+    
+    async with _stats_flush_lock:
+        pending = dict(_pending_stats)
+        if not any(pending.values()):
+            return
+        
+        async with db_write() as conn:
+            cursor = await conn.cursor()
+            await cursor.execute('UPDATE stats SET total_downloads = total_downloads + ?, total_searches = total_searches + ?, last_updated = CURRENT_TIMESTAMP WHERE id = 1',
+                         (pending["downloads"], pending["searches"]))
+        
+        # Only drop what was written; counts added during the write stay pending
+        for stat_type, count in pending.items():
+            _pending_stats[stat_type] -= count
+
+# Periodically flush buffered stats until cancelled
+async def stats_flusher():
+    while True:
+        await asyncio.sleep(STATS_FLUSH_INTERVAL)
+        try:
+            # Shielded so cancelling the flusher can't interrupt a commit before its counts
+            # are marked written
+            await asyncio.shield(flush_stats())
+        except Exception as e:
+            logger.error(f"Error flushing stats: {e}")
 
 # Command handlers
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    commands = (
-        "📤 Upload any file to store it\n"
-        "🔍 /search <keyword> - Search for files\n"
-        "📊 /stats - View bot statistics\n"
-        "🔗 /link <file_id> - Get a shareable link\n"
-        "📝 /editdesc <file_id> <description> - Edit file description\n"
-        "✏️ /editname <file_id> <new_name> - Edit file name\n"
-        "🏷️ /addtag <file_id> <tag> - Add tag to file\n"
-        "🏷️ /removetag <file_id> <tag> - Remove tag from file\n"
-        "👤 /addadmin <user_id> - Add new admin\n"
-        "👤 /removeadmin <user_id> - Remove admin\n"
-        "👥 /listadmins - List all admins\n"
-        "🗑️ /deletefile <file_id> - Delete a file\n"
-        "ⓘ /info <file_id> - Get file information\n"
-    )
-    
-    await update.message.reply_text(
-        f"Welcome to the File Sharing Bot!\n\n"
-        f"Admin Commands:\n{commands}\n\n"
-        f"Note: All commands can only be used by admins."
-    )
+    await update.message.reply_text(WELCOME_MESSAGE)
 
 @admin_only
 async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle file uploads from admins."""
     file = None
+    file_type = "document"
     file_name = "unknown"
     mime_type = "unknown"
     file_size = 0
+    now = datetime.datetime.now(datetime.timezone.utc)
     
     # Check which type of file it is
     if update.message.document:
         file = update.message.document
+        file_type = "document"
         file_name = file.file_name
         mime_type = file.mime_type
         file_size = file.file_size
     elif update.message.photo:
         file = update.message.photo[-1]  # Get the largest photo
-        file_name = f"photo_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
+        file_type = "photo"
+        file_name = f"photo_{now.strftime('%Y%m%d_%H%M%S')}.jpg"
         mime_type = "image/jpeg"
         file_size = file.file_size
     elif update.message.video:
         file = update.message.video
-        file_name = file.file_name or f"video_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4"
+        file_type = "video"
+        file_name = file.file_name or f"video_{now.strftime('%Y%m%d_%H%M%S')}.mp4"
         mime_type = file.mime_type
         file_size = file.file_size
     elif update.message.audio:
         file = update.message.audio
-        file_name = file.file_name or f"audio_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.mp3"
+        file_type = "audio"
+        file_name = file.file_name or f"audio_{now.strftime('%Y%m%d_%H%M%S')}.mp3"
         mime_type = file.mime_type
         file_size = file.file_size
     elif update.message.voice:
         file = update.message.voice
-        file_name = f"voice_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.ogg"
+        file_type = "voice"
+        file_name = f"voice_{now.strftime('%Y%m%d_%H%M%S')}.ogg"
         mime_type = file.mime_type
         file_size = file.file_size
     
     if file:
         # Save file info to database
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-        INSERT INTO files (file_id, file_name, description, uploaded_by, upload_date, mime_type, file_size)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            file.file_id,
-            file_name,
-            update.message.caption or "No description",
-            update.effective_user.id,
-            datetime.datetime.now().isoformat(),
-            mime_type,
-            file_size
-        ))
-        file_db_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        
-        # Update stats
-        await update_stats("files")
+        async with db_write() as conn:
+            cursor = await conn.cursor()
+            await cursor.execute('''
+            INSERT INTO files (file_id, file_name, description, uploaded_by, upload_date, mime_type, file_size, file_type)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, ?, ?, ?)
+            RETURNING id
+            ''', (
+                file.file_id,
+                file_name,
+                update.message.caption or "No description",
+                update.effective_user.id,
+                mime_type,
+                file_size,
+                file_type
+            ))
+            file_db_id = (await cursor.fetchone())[0]
+            
+            # Tag the file with any hashtags from the caption
+            caption = update.message.caption or ""
+            if "#" in caption:
+                tags = dict.fromkeys(tag.lower() for tag in TAG_RE.findall(caption))
+                await cursor.executemany('INSERT INTO tags (file_id, tag) VALUES (?, ?)',
+                                         [(file_db_id, tag) for tag in tags])
         
         # Notify uploader
         await update.message.reply_text(
             f"File uploaded successfully!\n"
             f"File ID: {file_db_id}\n"
             f"File Name: {file_name}\n"
-            f"Size: {file_size / 1024 / 1024:.2f} MB"
+            f"Size: {file_size * MB:.2f} MB"
         )
     else:
         await update.message.reply_text("No file detected. Please send a file to upload.")
@@ -226,61 +509,86 @@ async def search_files(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     keyword = ' '.join(context.args)
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Search in file names, descriptions, and tags
-    cursor.execute('''
-    SELECT DISTINCT f.id, f.file_name, f.description, f.mime_type, f.file_size, f.upload_date 
-    FROM files f
-    LEFT JOIN tags t ON f.id = t.file_id
-    WHERE f.file_name LIKE ? OR f.description LIKE ? OR t.tag LIKE ?
-    LIMIT 10
-    ''', (f'%{keyword}%', f'%{keyword}%', f'%{keyword}%'))
-    
-    files = cursor.fetchall()
-    conn.close()
+    async with db_read() as conn:
+        cursor = await conn.cursor()
+        
+        if _fts_enabled:
+            # Search in file names, descriptions, and tags, best matches first
+            await cursor.execute('''
+            SELECT f.id, f.file_name, f.description, f.mime_type, f.file_size, f.upload_date
+            FROM files_fts
+            JOIN files f ON f.id = files_fts.rowid
+            WHERE files_fts MATCH ?
+            ORDER BY bm25(files_fts, 10.0, 1.0, 5.0)
+            LIMIT 10
+            ''', (build_fts_query(keyword),))
+        else:
+            # Match name and description prefixes or an exact tag; one indexed lookup per
+            # branch, newest files first
+            prefix = build_like_prefix(keyword)
+            await cursor.execute('''
+            SELECT f.id, f.file_name, f.description, f.mime_type, f.file_size, f.upload_date
+            FROM files f
+            WHERE f.id IN (
+                SELECT id FROM files WHERE file_name LIKE ? ESCAPE '\\'
+                UNION
+                SELECT id FROM files WHERE description LIKE ? ESCAPE '\\'
+                UNION
+                SELECT file_id FROM tags WHERE tag = ?
+            )
+            ORDER BY f.id DESC
+            LIMIT 10
+            ''', (prefix, prefix, keyword.rstrip('*').lower()))
+        
+        # Format rows as they are read from the cursor
+        parts = [f"🔍 Search results for '{keyword}':\n\n"]
+        async for file in cursor:
+            parts.append(
+                f"ID: {file['id']}\n"
+                f"📄 {file['file_name']}\n"
+                f"📝 {file['description'][:50]}...\n"
+                f"📅 {file['upload_date'][:10]}\n"
+                f"💾 {file['file_size'] * MB:.2f} MB\n\n"
+            )
     
     # Update stats
-    await update_stats("searches")
+    update_stats("searches")
     
-    if not files:
+    if len(parts) == 1:
         await update.message.reply_text(f"No files found matching '{keyword}'.")
         return
     
-    result = f"🔍 Search results for '{keyword}':\n\n"
-    for file in files:
-        result += f"ID: {file['id']}\n"
-        result += f"📄 {file['file_name']}\n"
-        result += f"📝 {file['description'][:50]}...\n"
-        result += f"📅 {file['upload_date'][:10]}\n"
-        result += f"💾 {file['file_size'] / 1024 / 1024:.2f} MB\n\n"
-    
-    await update.message.reply_text(result)
+    await update.message.reply_text("".join(parts))
 
 @admin_only
 async def get_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Get bot statistics."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    stats = cursor.execute('SELECT * FROM stats WHERE id = 1').fetchone()
-    
-    # Count total admins
-    total_admins = cursor.execute('SELECT COUNT(*) as count FROM admins').fetchone()['count']
-    
-    # Count total space used
-    total_size = cursor.execute('SELECT SUM(file_size) as total FROM files').fetchone()['total'] or 0
-    
-    conn.close()
+    async with db_read() as conn:
+        cursor = await conn.cursor()
+        
+        # File totals are computed from the files table itself, alongside the
+        # stored counters, in a single round-trip
+        await cursor.execute('''
+        SELECT
+            (SELECT COUNT(*) FROM files) AS total_files,
+            (SELECT COALESCE(SUM(file_size), 0) FROM files) AS total_size,
+            (SELECT COUNT(*) FROM admins) AS total_admins,
+            s.total_downloads,
+            s.total_searches,
+            s.last_updated
+        FROM stats s
+        WHERE s.id = 1
+        ''')
+        stats = await cursor.fetchone()
     
     await update.message.reply_text(
         f"📊 Bot Statistics 📊\n\n"
         f"Total Files: {stats['total_files']}\n"
         f"Total Downloads: {stats['total_downloads']}\n"
         f"Total Searches: {stats['total_searches']}\n"
-        f"Total Admins: {total_admins}\n"
-        f"Total Storage Used: {total_size / 1024 / 1024 / 1024:.2f} GB\n"
-        f"Last Updated: {stats['last_updated'][:19]}"
+        f"Total Admins: {stats['total_admins']}\n"
+        f"Total Storage Used: {stats['total_size'] * GB:.2f} GB\n"
+        f"Last Updated: {format_timestamp(stats['last_updated'])}"
     )
 
 @admin_only
@@ -292,21 +600,21 @@ async def get_link(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     file_id = int(context.args[0])
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    file = cursor.execute('SELECT * FROM files WHERE id = ?', (file_id,)).fetchone()
-    conn.close()
+    async with db_read() as conn:
+        cursor = await conn.cursor()
+        cursor.row_factory = None
+        await cursor.execute('SELECT file_name FROM files WHERE id = ?', (file_id,))
+        file = await cursor.fetchone()
     
     if not file:
         await update.message.reply_text(f"File with ID {file_id} not found.")
         return
     
-    # Create a shareable link
-    bot_username = (await context.bot.get_me()).username
-    link = f"https://t.me/{bot_username}?start=file_{file_id}"
+    # Create a shareable link; the username is fetched once when the application initializes
+    link = f"https://t.me/{context.bot.username}?start=file_{file_id}"
     
     await update.message.reply_text(
-        f"🔗 Shareable link for '{file['file_name']}':\n{link}"
+        f"🔗 Shareable link for '{file[0]}':\n{link}"
     )
 
 @admin_only
@@ -324,12 +632,10 @@ async def edit_description(update: Update, context: ContextTypes.DEFAULT_TYPE):
     file_id = int(file_id)
     new_desc = ' '.join(context.args[1:])
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('UPDATE files SET description = ? WHERE id = ?', (new_desc, file_id))
-    affected_rows = conn.total_changes
-    conn.commit()
-    conn.close()
+    async with db_write() as conn:
+        cursor = await conn.cursor()
+        await cursor.execute('UPDATE files SET description = ? WHERE id = ?', (new_desc, file_id))
+        affected_rows = cursor.rowcount
     
     if affected_rows > 0:
         await update.message.reply_text(f"Description updated for file ID {file_id}.")
@@ -351,12 +657,10 @@ async def edit_filename(update: Update, context: ContextTypes.DEFAULT_TYPE):
     file_id = int(file_id)
     new_name = ' '.join(context.args[1:])
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('UPDATE files SET file_name = ? WHERE id = ?', (new_name, file_id))
-    affected_rows = conn.total_changes
-    conn.commit()
-    conn.close()
+    async with db_write() as conn:
+        cursor = await conn.cursor()
+        await cursor.execute('UPDATE files SET file_name = ? WHERE id = ?', (new_name, file_id))
+        affected_rows = cursor.rowcount
     
     if affected_rows > 0:
         await update.message.reply_text(f"File name updated for file ID {file_id}.")
@@ -376,24 +680,19 @@ async def add_tag(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     file_id = int(file_id)
-    tag = ' '.join(context.args[1:])
+    tag = ' '.join(context.args[1:]).lower()
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    async with db_write() as conn:
+        cursor = await conn.cursor()
+        
+        # Add tag; the insert selects from files, so nothing is written if the file doesn't exist
+        await cursor.execute('INSERT INTO tags (file_id, tag) SELECT id, ? FROM files WHERE id = ?', (tag, file_id))
+        affected_rows = cursor.rowcount
     
-    # Check if file exists
-    file = cursor.execute('SELECT * FROM files WHERE id = ?', (file_id,)).fetchone()
-    if not file:
-        conn.close()
+    if affected_rows > 0:
+        await update.message.reply_text(f"Tag '{tag}' added to file ID {file_id}.")
+    else:
         await update.message.reply_text(f"File with ID {file_id} not found.")
-        return
-    
-    # Add tag
-    cursor.execute('INSERT INTO tags (file_id, tag) VALUES (?, ?)', (file_id, tag))
-    conn.commit()
-    conn.close()
-    
-    await update.message.reply_text(f"Tag '{tag}' added to file ID {file_id}.")
 
 @admin_only
 async def remove_tag(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -408,14 +707,12 @@ async def remove_tag(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     file_id = int(file_id)
-    tag = ' '.join(context.args[1:])
+    tag = ' '.join(context.args[1:]).lower()
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM tags WHERE file_id = ? AND tag = ?', (file_id, tag))
-    affected_rows = conn.total_changes
-    conn.commit()
-    conn.close()
+    async with db_write() as conn:
+        cursor = await conn.cursor()
+        await cursor.execute('DELETE FROM tags WHERE file_id = ? AND tag = ?', (file_id, tag))
+        affected_rows = cursor.rowcount
     
     if affected_rows > 0:
         await update.message.reply_text(f"Tag '{tag}' removed from file ID {file_id}.")
@@ -431,17 +728,19 @@ async def add_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     new_admin_id = int(context.args[0])
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute('INSERT INTO admins (user_id, added_on) VALUES (?, ?)', 
-                     (new_admin_id, datetime.datetime.now().isoformat()))
-        conn.commit()
+    async with db_write() as conn:
+        cursor = await conn.cursor()
+        # Existence check and insert in one statement; no row is written if already an admin
+        await cursor.execute('INSERT OR IGNORE INTO admins (user_id, added_on) VALUES (?, CURRENT_TIMESTAMP)', 
+                     (new_admin_id,))
+        added = cursor.rowcount > 0
+    
+    if added:
+        if _admin_cache is not None:
+            _admin_cache.add(new_admin_id)
         await update.message.reply_text(f"User {new_admin_id} added as admin.")
-    except sqlite3.IntegrityError:
+    else:
         await update.message.reply_text(f"User {new_admin_id} is already an admin.")
-    finally:
-        conn.close()
 
 @admin_only
 async def remove_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -457,14 +756,14 @@ async def remove_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Cannot remove the initial admin.")
         return
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM admins WHERE user_id = ?', (admin_id,))
-    affected_rows = conn.total_changes
-    conn.commit()
-    conn.close()
+    async with db_write() as conn:
+        cursor = await conn.cursor()
+        await cursor.execute('DELETE FROM admins WHERE user_id = ?', (admin_id,))
+        affected_rows = cursor.rowcount
     
     if affected_rows > 0:
+        if _admin_cache is not None:
+            _admin_cache.discard(admin_id)
         await update.message.reply_text(f"Admin {admin_id} has been removed.")
     else:
         await update.message.reply_text(f"User {admin_id} is not an admin.")
@@ -472,22 +771,24 @@ async def remove_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
 @admin_only
 async def list_admins(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """List all admins."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    admins = cursor.execute('SELECT user_id, added_on FROM admins ORDER BY id').fetchall()
-    conn.close()
+    async with db_read() as conn:
+        cursor = await conn.cursor()
+        await cursor.execute('SELECT user_id, added_on FROM admins ORDER BY id')
+        admins = await cursor.fetchall()
     
     if not admins:
         await update.message.reply_text("No admins found.")
         return
     
-    result = "👥 Admin List:\n\n"
-    for admin in admins:
-        result += f"👤 ID: {admin['user_id']}\n"
-        result += f"📅 Added: {admin['added_on'][:10]}\n"
-        result += "------------------------\n"
+    parts = ["👥 Admin List:\n\n"]
+    parts.extend(
+        f"👤 ID: {admin['user_id']}\n"
+        f"📅 Added: {admin['added_on'][:10]}\n"
+        "------------------------\n"
+        for admin in admins
+    )
     
-    await update.message.reply_text(result)
+    await update.message.reply_text("".join(parts))
 
 @admin_only
 async def delete_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -498,28 +799,25 @@ async def delete_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     file_id = int(context.args[0])
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # First get the file info for confirmation
-    file = cursor.execute('SELECT * FROM files WHERE id = ?', (file_id,)).fetchone()
+    async with db_write() as conn:
+        cursor = await conn.cursor()
+        cursor.row_factory = None
+        
+        # Delete the file, returning its name for confirmation
+        # Tags will be deleted automatically due to ON DELETE CASCADE
+        await cursor.execute('DELETE FROM files WHERE id = ? RETURNING file_name', (file_id,))
+        file = await cursor.fetchone()
     
     if not file:
-        conn.close()
         await update.message.reply_text(f"File with ID {file_id} not found.")
         return
     
-    # Delete the file
-    cursor.execute('DELETE FROM files WHERE id = ?', (file_id,))
-    # Tags will be deleted automatically due to ON DELETE CASCADE
-    
-    conn.commit()
-    conn.close()
+    _file_cache.pop(file_id, None)
     
     await update.message.reply_text(
         f"File deleted successfully:\n"
         f"ID: {file_id}\n"
-        f"Name: {file['file_name']}"
+        f"Name: {file[0]}"
     )
 
 @admin_only
@@ -531,103 +829,220 @@ async def get_file_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     file_id = int(context.args[0])
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Get file info
-    file = cursor.execute('SELECT * FROM files WHERE id = ?', (file_id,)).fetchone()
+    async with db_read() as conn:
+        cursor = await conn.cursor()
+        
+        # Get file info and its tags in one query
+        await cursor.execute('''
+        SELECT f.id, f.file_id, f.file_name, f.description, f.uploaded_by, f.upload_date,
+               f.mime_type, f.file_size, GROUP_CONCAT(t.tag, ', ') AS tags
+        FROM files f
+        LEFT JOIN tags t ON t.file_id = f.id
+        WHERE f.id = ?
+        GROUP BY f.id
+        ''', (file_id,))
+        file = await cursor.fetchone()
     
     if not file:
-        conn.close()
         await update.message.reply_text(f"File with ID {file_id} not found.")
         return
     
-    # Get tags
-    tags = cursor.execute('SELECT tag FROM tags WHERE file_id = ?', (file_id,)).fetchall()
-    tag_list = [tag['tag'] for tag in tags]
-    
-    conn.close()
-    
     # Send file info
     info_text = (
         f"ⓘ File Information\n\n"
         f"ID: {file['id']}\n"
         f"Name: {file['file_name']}\n"
         f"Description: {file['description']}\n"
-        f"Size: {file['file_size'] / 1024 / 1024:.2f} MB\n"
+        f"Size: {file['file_size'] * MB:.2f} MB\n"
         f"Type: {file['mime_type']}\n"
         f"Uploaded by: {file['uploaded_by']}\n"
-        f"Upload date: {file['upload_date'][:19]}\n"
-        f"Tags: {', '.join(tag_list) if tag_list else 'No tags'}"
+        f"Upload date: {format_timestamp(file['upload_date'])}\n"
+        f"Tags: {file['tags'] or 'No tags'}"
     )
     
     # Create keyboard with download button
     keyboard = [
-        [InlineKeyboardButton("Download File", callback_data=f"download_{file['file_id']}")]
+        [InlineKeyboardButton("Download File", callback_data=f"dl_{file['id']}")]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await update.message.reply_text(info_text, reply_markup=reply_markup)
 
+# Bot method that sends each stored file type; all take (chat_id, file, caption=...)
+SEND_METHODS = {
+    "document": "send_document",
+    "photo": "send_photo",
+    "video": "send_video",
+    "audio": "send_audio",
+    "voice": "send_voice",
+}
+
+# Look up a file's Telegram file ID and type, caching hits so bursts of Download presses share one query
+async def get_download_info(file_db_id):
+    cached = _file_cache.get(file_db_id)
+    if cached and cached[2] > time.monotonic():
+        _file_cache.move_to_end(file_db_id)
+        return cached[:2]
+    
+    async with db_read() as conn:
+        cursor = await conn.cursor()
+        await cursor.execute('SELECT file_id, file_type FROM files WHERE id = ?', (file_db_id,))
+        file = await cursor.fetchone()
+    
+    if not file:
+        _file_cache.pop(file_db_id, None)
+        return None
+    
+    _file_cache[file_db_id] = (file['file_id'], file['file_type'], time.monotonic() + FILE_CACHE_TTL)
+    _file_cache.move_to_end(file_db_id)
+    if len(_file_cache) > FILE_CACHE_SIZE:
+        _file_cache.popitem(last=False)
+    return file['file_id'], file['file_type']
+
+async def send_download(update: Update, context: ContextTypes.DEFAULT_TYPE, file_db_id):
+    """Send a file for a Download button carrying its database ID."""
+    query = update.callback_query
+    if not file_db_id.isdigit():
+        return
+    
+    download_info = await get_download_info(int(file_db_id))
+    if not download_info:
+        await query.message.reply_text(f"File with ID {file_db_id} not found.")
+        return
+    
+    await send_stored_file(update, context, *download_info)
+
+async def send_stored_file(update: Update, context: ContextTypes.DEFAULT_TYPE, telegram_file_id, file_type="document"):
+    """Send a file by its Telegram file ID, using the send method for its type."""
+    query = update.callback_query
+    
+    try:
+        # Send the file
+        send = getattr(context.bot, SEND_METHODS.get(file_type, "send_document"))
+        await send(
+            query.message.chat_id,
+            telegram_file_id,
+            caption="Here's your requested file."
+        )
+    except Exception as e:
+        logger.error(f"Error sending file: {e}")
+        await query.message.reply_text(f"Error sending file: {str(e)}")
+        return
+    
+    # Only count downloads that were actually sent
+    update_stats("downloads")
+
+# Button handlers, keyed by the action prefix of the callback data ("<action>_<payload>")
+CALLBACK_HANDLERS = {
+    "dl": send_download,
+    # Buttons sent before callback data carried the database ID
+    "download": send_stored_file,
+}
+
+@admin_only
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle button callbacks."""
     query = update.callback_query
-    await query.answer()
     
     # Parse callback data
-    data = query.data
+    action, _, payload = query.data.partition("_")
     
-    if data.startswith("download_"):
-        telegram_file_id = data.split("_")[1]
-        
-        # Update download stats
-        await update_stats("downloads")
-        
-        try:
-            # Send the file
-            await context.bot.send_document(
-                chat_id=query.message.chat_id,
-                document=telegram_file_id,
-                caption="Here's your requested file."
-            )
-        except Exception as e:
-            logger.error(f"Error sending file: {e}")
-            await query.message.reply_text(f"Error sending file: {str(e)}")
+    handler = CALLBACK_HANDLERS.get(action)
+    if handler:
+        # Acknowledging the button doesn't depend on the handler, so run both at once
+        await asyncio.gather(query.answer(), handler(update, context, payload))
+    else:
+        await query.answer()
+
+# Command handlers, keyed by command name; admin checks stay on the handlers themselves
+COMMAND_HANDLERS = {
+    "start": start,
+    "search": search_files,
+    "stats": get_stats,
+    "link": get_link,
+    "editdesc": edit_description,
+    "editname": edit_filename,
+    "addtag": add_tag,
+    "removetag": remove_tag,
+    "addadmin": add_admin,
+    "removeadmin": remove_admin,
+    "listadmins": list_admins,
+    "deletefile": delete_file,
+    "info": get_file_info,
+}
+
+# Uploads are any attachment that isn't a command
+UPLOAD_FILTER = filters.ATTACHMENT & ~filters.COMMAND
+
+async def dispatch_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Route a command to its handler."""
+    # Take the name from the command entity, as CommandHandler does: "/cmd@botname" -> "cmd".
+    # Telegram ends the entity at the first non-word character, so "/stats." is "stats"
+    message = update.effective_message
+    command = message.text[1:message.entities[0].length].partition("@")[0].lower()
+    await COMMAND_HANDLERS[command](update, context)
+
+async def post_init(application: Application):
+    """Prepare resources once the event loop is running."""
+    global _stats_flusher_task, _stats_flush_lock
+    
+    # Open database connections and initialize the schema
+    await open_db_pools()
+    await init_db()
+    await load_admin_cache()
+    
+    # Start writing buffered stats in the background
+    _stats_flush_lock = asyncio.Lock()
+    _stats_flusher_task = asyncio.create_task(stats_flusher())
+
+async def post_shutdown(application: Application):
+    """Release resources after the bot has stopped."""
+    if _stats_flusher_task is not None:
+        _stats_flusher_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await _stats_flusher_task
+    
+    # Write any stats still buffered in memory; this waits for a flush already in progress.
+    # The connections are closed regardless, as their threads would keep the process alive
+    try:
+        await flush_stats()
+    finally:
+        await close_db_pools()
 
 def main():
     """Start the bot."""
     # Create the Application
-    application = Application.builder().token(BOT_TOKEN).build()
-
-    # Initialize database
-    init_db()
-
-    # Add command handlers
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("search", search_files))
-    application.add_handler(CommandHandler("stats", get_stats))
-    application.add_handler(CommandHandler("link", get_link))
-    application.add_handler(CommandHandler("editdesc", edit_description))
-    application.add_handler(CommandHandler("editname", edit_filename))
-    application.add_handler(CommandHandler("addtag", add_tag))
-    application.add_handler(CommandHandler("removetag", remove_tag))
-    application.add_handler(CommandHandler("addadmin", add_admin))
-    application.add_handler(CommandHandler("removeadmin", remove_admin))
-    application.add_handler(CommandHandler("listadmins", list_admins))
-    application.add_handler(CommandHandler("deletefile", delete_file))
-    application.add_handler(CommandHandler("info", get_file_info))
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .connection_pool_size(CONNECTION_POOL_SIZE)
+        .pool_timeout(POOL_TIMEOUT)
+        .get_updates_pool_timeout(POOL_TIMEOUT)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+
+    # Add a single command handler that routes by command name
+    application.add_handler(CommandHandler(list(COMMAND_HANDLERS), dispatch_command))
     
     # Add file handler for admins
-    application.add_handler(MessageHandler(
-        filters.ATTACHMENT & ~filters.COMMAND,
-        handle_file
-    ))
+    application.add_handler(MessageHandler(UPLOAD_FILTER, handle_file))
     
     # Add callback query handler for buttons
     application.add_handler(CallbackQueryHandler(button_callback))
 
     # Start the Bot
-    application.run_polling()
+    if WEBHOOK_URL:
+        application.run_webhook(
+            listen="0.0.0.0",
+            port=PORT,
+            url_path=BOT_TOKEN,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{BOT_TOKEN}"
+        )
+    else:
+        application.run_polling()
 
 if __name__ == '__main__':
     main()